@@ -0,0 +1,174 @@
+import math
+import threading
+from time import monotonic, sleep
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import InvalidHeader
+from urllib3.util.retry import Retry
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.77 Safari/537.36"
+}
+
+# Dropped connections are retried inside the adapter; retryable statuses are
+# handled by `_get` instead, so each retry goes back through the rate limiter
+_RETRY = Retry(
+    total=3,
+    backoff_factor=0.3,
+    allowed_methods=frozenset(["GET"]),
+)
+
+# Responses `_get` retries with backoff, honouring Retry-After
+_RETRY_STATUSES = frozenset([429, 500, 502, 503, 504])
+_STATUS_RETRIES = 3
+
+
+def _configure_session(session: requests.Session) -> requests.Session:
+    """
+    Apply the package's default headers and pooled, retrying adapter to a session
+    """
+    session.headers.update(HEADERS)
+    session.mount(
+        "https://",
+        HTTPAdapter(pool_connections=4, pool_maxsize=20, max_retries=_RETRY),
+    )
+    return session
+
+
+# Default upper bound on requests per second to Substack, shared by every
+# module and worker thread; see `set_rate_limit` / `get_rate_limit`
+REQUESTS_PER_SECOND = 2
+
+# Shared session so repeated calls reuse pooled keep-alive connections
+_SESSION = _configure_session(requests.Session())
+
+
+def enable_response_cache(
+    expire_after: Optional[int] = 300, cache_name: str = "substack_api"
+) -> None:
+    """
+    Cache GET responses in a local SQLite database (requires `requests-cache`)
+
+    Parameters
+    ----------
+    expire_after : Seconds a cached response stays fresh, or None to follow the
+        server's Cache-Control headers (responses without them never expire)
+    cache_name : Path of the SQLite cache file (without extension)
+    """
+    global _SESSION
+    try:
+        import requests_cache
+    except ImportError as e:
+        raise ImportError(
+            "enable_response_cache requires requests-cache; "
+            'install it with `pip install "substack-api[cache]"`'
+        ) from e
+
+    _SESSION = _configure_session(
+        requests_cache.CachedSession(
+            cache_name,
+            backend="sqlite",
+            expire_after=expire_after,
+            cache_control=expire_after is None,
+            allowable_methods=("GET",),
+        )
+    )
+
+
+class _RateLimiter:
+    """
+    Thread-safe token bucket permitting `rate` requests per second
+
+    Callers only block once the bucket is empty, so time already spent
+    waiting on the network counts toward the interval between requests.
+    """
+
+    def __init__(self, rate: float, capacity: int = 1):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._last = monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        with self._lock:
+            now = monotonic()
+            self._tokens = min(
+                self.capacity, self._tokens + (now - self._last) * self.rate
+            )
+            self._last = now
+            # Reserve a token now; a negative balance queues later callers
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait > 0:
+            sleep(wait)
+
+
+_LIMITER = _RateLimiter(REQUESTS_PER_SECOND, capacity=REQUESTS_PER_SECOND)
+
+
+def set_rate_limit(requests_per_second: float) -> None:
+    """
+    Change how many requests per second the package makes to Substack
+
+    Parameters
+    ----------
+    requests_per_second : New request budget, shared across concurrent workers
+    """
+    global _LIMITER
+    if requests_per_second <= 0:
+        raise ValueError("requests_per_second must be positive")
+    _LIMITER = _RateLimiter(
+        requests_per_second, capacity=max(1, math.ceil(requests_per_second))
+    )
+
+
+def get_rate_limit() -> float:
+    """
+    Get how many requests per second the package currently makes to Substack
+    """
+    return _LIMITER.rate
+
+
+def _get(
+    url: str, cancelled: Optional[threading.Event] = None
+) -> Optional[requests.Response]:
+    """
+    Rate-limited GET over the shared session; rate limiting and transient
+    server errors are retried, each attempt waiting on the limiter again.
+    Returns None without sending if `cancelled` is set while waiting.
+    """
+    for attempt in range(_STATUS_RETRIES + 1):
+        _LIMITER.acquire()
+        if cancelled is not None and cancelled.is_set():
+            return None
+        r = _SESSION.get(url, timeout=30)
+        if r.status_code not in _RETRY_STATUSES or attempt == _STATUS_RETRIES:
+            return r
+        sleep(_retry_delay(r, attempt))
+
+
+def _retry_delay(r: requests.Response, attempt: int) -> float:
+    retry_after = r.headers.get("Retry-After")
+    if retry_after is not None:
+        try:
+            return _RETRY.parse_retry_after(retry_after)
+        except InvalidHeader:
+            pass
+    return _RETRY.backoff_factor * (2**attempt)
+
+
+def _json(r: requests.Response):
+    """
+    Decode a JSON response body, using orjson when it is installed
+    """
+    if orjson is None:
+        return r.json()
+    return orjson.loads(r.content)
@@ -1,24 +1,59 @@
+import logging
 import math
-from time import sleep
-from typing import Dict, List, Tuple, Union
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from copy import deepcopy
+from functools import lru_cache
+from itertools import chain
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+from urllib.parse import urlencode
 
 from bs4 import BeautifulSoup
-import requests
 
+from substack_api._http import (  # noqa: F401
+    HEADERS,
+    _get,
+    _json,
+    enable_response_cache,
+    get_rate_limit,
+    set_rate_limit,
+)
 
-HEADERS = {
-    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.77 Safari/537.36"
-}
+try:
+    import lxml  # noqa: F401
+
+    _HTML_PARSER = "lxml"
+except ImportError:  # pragma: no cover - optional speedup
+    _HTML_PARSER = "html.parser"
+
+
+logger = logging.getLogger(__name__)
+
+# Number of pages requested concurrently when paginating
+MAX_WORKERS = 8
+
+
+@lru_cache(maxsize=1)
+def _fetch_categories() -> Tuple[Dict[str, int], Dict[int, str]]:
+    """
+    Fetch the category list once per process as (name -> id, id -> name) maps;
+    call `cache_clear()` to refetch
+    """
+    endpoint_cat = "https://substack.com/api/v1/categories"
+    r = _get(endpoint_cat)
+    name_to_id = {i["name"]: i["id"] for i in _json(r)}
+    id_to_name = {v: k for k, v in name_to_id.items()}
+    return name_to_id, id_to_name
 
 
 def list_all_categories() -> List[Tuple[str, int]]:
     """
     Get name / id representations of all newsletter categories
     """
-    endpoint_cat = "https://substack.com/api/v1/categories"
-    r = requests.get(endpoint_cat, headers=HEADERS, timeout=30)
-    categories = [(i["name"], i["id"]) for i in r.json()]
-    return categories
+    name_to_id, _ = _fetch_categories()
+    return list(name_to_id.items())
 
 
 def category_id_to_name(user_id: int) -> str:
@@ -29,12 +64,11 @@ def category_id_to_name(user_id: int) -> str:
     ----------
     id : Numerical category identifier
     """
-    categories = list_all_categories()
-    category_name = [i[0] for i in categories if i[1] == user_id]
-    if len(category_name) > 0:
-        return category_name[0]
-
-    raise ValueError(f"{user_id} is not in Substack's list of categories")
+    _, id_to_name = _fetch_categories()
+    try:
+        return id_to_name[user_id]
+    except KeyError:
+        raise ValueError(f"{user_id} is not in Substack's list of categories")
 
 
 def category_name_to_id(name: str) -> int:
@@ -45,11 +79,10 @@ def category_name_to_id(name: str) -> int:
     ----------
     name : Category name
     """
-    categories = list_all_categories()
-    category_id = [i[1] for i in categories if i[0] == name]
-    if len(category_id) > 0:
-        return category_id[0]
-    else:
+    name_to_id, _ = _fetch_categories()
+    try:
+        return name_to_id[name]
+    except KeyError:
         raise ValueError(f"{name} is not in Substack's list of categories")
 
 
@@ -73,23 +106,46 @@ def get_newsletters_in_category(
     page_num_end = math.inf if end_page is None else end_page
 
     base_url = f"https://substack.com/api/v1/category/public/{category_id}/all?page="
-    page_num = 0
-    more = True
-    all_pubs = []
-    while more and page_num < page_num_end:
-        full_url = base_url + str(page_num)
-        pubs = requests.get(full_url, headers=HEADERS, timeout=30).json()
-        more = pubs["more"]
-        if subdomains_only:
-            pubs = [i["id"] for i in pubs["publications"]]
-        else:
-            pubs = pubs["publications"]
-        all_pubs.extend(pubs)
-        page_num += 1
-        print(f"page {page_num} done")
-        sleep(1)
 
-    return all_pubs
+    # Set once the last page is seen, so requests for later pages still
+    # waiting on the rate limiter are dropped instead of sent
+    past_end = threading.Event()
+
+    def fetch_page(page: int) -> Optional[Dict]:
+        r = _get(base_url + str(page), cancelled=past_end)
+        return None if r is None else _json(r)
+
+    # The first page is fetched on its own to learn whether there are more;
+    # after that, pages are requested MAX_WORKERS at a time
+    window = 1
+    more = page_num < page_num_end
+    pages = []
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        while more:
+            window_end = min(page_num + window, page_num_end)
+            futures = [
+                executor.submit(fetch_page, page)
+                for page in range(page_num, window_end)
+            ]
+            for future in futures:
+                pubs = future.result()
+                more = pubs["more"]
+                if subdomains_only:
+                    pubs = [i["id"] for i in pubs["publications"]]
+                else:
+                    pubs = pubs["publications"]
+                pages.append(pubs)
+                page_num += 1
+                logger.debug("page %d done", page_num)
+                if not more:
+                    past_end.set()
+                    for f in futures:
+                        f.cancel()
+                    break
+            more = more and page_num < page_num_end
+            window = MAX_WORKERS
+
+    return list(chain.from_iterable(pages))
 
 
 def get_newsletter_post_metadata(
@@ -111,30 +167,114 @@ def get_newsletter_post_metadata(
     offset_start = 0 if start_offset is None else start_offset
     offset_end = math.inf if end_offset is None else end_offset
 
-    last_id_ref = 0
-    all_posts = []
-    while offset_start < offset_end:
-        full_url = f"https://{newsletter_subdomain}.substack.com/api/v1/archive?sort=new&search=&offset={offset_start}&limit=10"
-        posts = requests.get(full_url, headers=HEADERS, timeout=30).json()
+    # With a known end the pages to fetch are bounded, so up to MAX_WORKERS
+    # are requested at a time; without one, requests beyond the end of the
+    # archive would be wasted, so pages are fetched one ahead
+    ahead = 1 if end_offset is None else MAX_WORKERS
+    with closing(
+        _iter_archive_pages(newsletter_subdomain, offset_start, offset_end, ahead)
+    ) as pages:
+        posts = list(chain.from_iterable(pages))
 
-        if len(posts) == 0:
-            break
+    if slugs_only:
+        return [i["slug"] for i in posts]
+    return posts
 
-        last_id = posts[-1]["id"]
-        if last_id == last_id_ref:
-            break
 
-        last_id_ref = last_id
+def iter_newsletter_post_metadata(
+    newsletter_subdomain: str,
+    slugs_only: bool = False,
+    start_offset: int = None,
+    end_offset: int = None,
+) -> Iterator:
+    """
+    Lazily yield post metadata for newsletter; each page is requested only once
+    the one before it is handed out, so stopping early skips the rest
 
-        if slugs_only:
-            all_posts.extend([i["slug"] for i in posts])
-        else:
-            all_posts.extend(posts)
+    Parameters
+    ----------
+    newsletter_subdomain : Substack subdomain of newsletter
+    slugs_only : Whether to yield only post slugs (needed for post content collection)
+    start_offset : Start offset for paginated API results
+    end_offset : End offset for paginated API results
+    """
+    offset_start = 0 if start_offset is None else start_offset
+    offset_end = math.inf if end_offset is None else end_offset
 
-        offset_start += 10
-        sleep(1)
+    with closing(
+        _iter_archive_pages(newsletter_subdomain, offset_start, offset_end, 1)
+    ) as pages:
+        for posts in pages:
+            if slugs_only:
+                yield from (i["slug"] for i in posts)
+            else:
+                yield from posts
 
-    return all_posts
+
+def _iter_archive_pages(
+    newsletter_subdomain: str, offset_start: int, offset_end: float, ahead: int
+) -> Iterator[List[Dict]]:
+    """
+    Yield a newsletter's archive pages in order, keeping up to `ahead` further
+    pages requested while each one is handed out
+    """
+    static_qs = urlencode({"sort": "new", "search": ""})
+    endpoint_base = (
+        f"https://{newsletter_subdomain}.substack.com/api/v1/archive?{static_qs}"
+    )
+    # Set once iteration stops, so pages still waiting on the rate limiter
+    # are dropped instead of sent
+    stopped = threading.Event()
+
+    def fetch_page(offset: int) -> Tuple[int, Optional[List[Dict]]]:
+        # Ask for no more than end_offset requires on the final page
+        limit = min(10, offset_end - offset)
+        r = _get(f"{endpoint_base}&offset={offset}&limit={limit}", cancelled=stopped)
+        return limit, None if r is None else _json(r)
+
+    executor = ThreadPoolExecutor(max_workers=ahead)
+    pending = deque()
+    next_offset = offset_start
+
+    def submit(n: int) -> None:
+        nonlocal next_offset
+        for _ in range(n):
+            if next_offset >= offset_end:
+                return
+            pending.append(executor.submit(fetch_page, next_offset))
+            next_offset += 10
+
+    last_id_ref = 0
+    try:
+        # The first page is fetched on its own, so an archive that fits on
+        # one page costs a single request
+        submit(1)
+        while pending:
+            limit, posts = pending.popleft().result()
+            if len(posts) == 0:
+                break
+
+            last_id = posts[-1]["id"]
+            if last_id == last_id_ref:
+                break
+
+            last_id_ref = last_id
+            # A short page is the end of the archive; don't spend another
+            # round trip just to find an empty page
+            last_page = len(posts) < limit
+            if not last_page:
+                submit(ahead - len(pending))
+
+            yield posts
+
+            if last_page:
+                break
+    finally:
+        stopped.set()
+        for future in pending:
+            future.cancel()
+        # Don't block a caller that stops early on a page still downloading
+        executor.shutdown(wait=False)
 
 
 def get_post_contents(
@@ -150,13 +290,43 @@ def get_post_contents(
     html_only : Whether to get only HTML of body text, or all metadata/content
     """
     endpoint = f"https://{newsletter_subdomain}.substack.com/api/v1/posts/{slug}"
-    post_info = requests.get(endpoint, headers=HEADERS, timeout=30).json()
+    post_info = _json(_get(endpoint))
     if html_only:
         return post_info["body_html"]
 
     return post_info
 
 
+def get_posts_contents(
+    newsletter_subdomain: str, slugs: List[str], html_only: bool = False
+) -> List[Union[Dict, str]]:
+    """
+    Gets metadata and contents for several posts concurrently, in the order given;
+    a slug listed more than once is fetched once, and each repeat is a copy
+
+    Parameters
+    ----------
+    newsletter_subdomain : Substack subdomain of newsletter
+    slugs : Slugs of posts to retrieve (can be retrieved from `get_newsletter_post_metadata`)
+    html_only : Whether to get only HTML of body text, or all metadata/content
+    """
+
+    def fetch(slug: str) -> Union[Dict, str]:
+        return get_post_contents(newsletter_subdomain, slug, html_only=html_only)
+
+    unique_slugs = list(dict.fromkeys(slugs))
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        contents = dict(zip(unique_slugs, executor.map(fetch, unique_slugs)))
+
+    # Repeats get their own copy so mutating one entry leaves the others alone
+    results = []
+    seen = set()
+    for slug in slugs:
+        results.append(deepcopy(contents[slug]) if slug in seen else contents[slug])
+        seen.add(slug)
+    return results
+
+
 def get_newsletter_recommendations(newsletter_subdomain: str) -> List[Dict[str, str]]:
     """
     Gets recommended newsletters for a given newsletter
@@ -166,13 +336,34 @@ def get_newsletter_recommendations(newsletter_subdomain: str) -> List[Dict[str,
     newsletter_subdomain : Substack subdomain of newsletter
     """
     endpoint = f"https://{newsletter_subdomain}.substack.com/recommendations"
-    r = requests.get(endpoint, headers=HEADERS, timeout=30)
+    r = _get(endpoint)
     recs = r.text
-    soup = BeautifulSoup(recs, "html.parser")
-    div_elements = soup.find_all("div", class_="publication-content")
-    a_elements = [div.find("a") for div in div_elements]
-    titles = [i.text for i in soup.find_all("div", {"class": "publication-title"})]
-    links = [i["href"].split("?")[0] for i in a_elements]
+    soup = BeautifulSoup(recs, _HTML_PARSER)
+    # Collect titles and links in a single walk over the document
+    titles, links = [], []
+    for div in soup.find_all(
+        "div", class_=["publication-title", "publication-content"]
+    ):
+        if "publication-title" in div["class"]:
+            titles.append(div.text)
+        else:
+            links.append(div.find("a")["href"].split("?")[0])
     results = [{"title": t, "url": u} for t, u in zip(titles, links)]
 
     return results
+
+
+def get_recommendations_for_newsletters(
+    newsletter_subdomains: List[str],
+) -> Dict[str, List[Dict[str, str]]]:
+    """
+    Gets recommended newsletters for several newsletters concurrently
+
+    Parameters
+    ----------
+    newsletter_subdomains : Substack subdomains of newsletters
+    """
+    unique_subdomains = list(dict.fromkeys(newsletter_subdomains))
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        recs = executor.map(get_newsletter_recommendations, unique_subdomains)
+        return dict(zip(unique_subdomains, recs))
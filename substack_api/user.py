@@ -1,39 +1,65 @@
+from concurrent.futures import ThreadPoolExecutor
+from copy import deepcopy
+from functools import lru_cache
 from typing import Dict, List
 
-import requests
+from substack_api._http import HEADERS, _get, _json  # noqa: F401
 
-HEADERS = {
-    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.77 Safari/537.36"
-}
+# Endpoint templates, formatted per user
+_PROFILE_URL = "https://substack.com/api/v1/user/{}/public_profile".format
+_FEED_URL = "https://substack.com/api/v1/reader/feed/profile/{}".format
+
+
+@lru_cache(maxsize=1024)
+def _cached_public_profile(username: str) -> Dict:
+    """
+    Fetch a user's public profile once per process; call `cache_clear()` to refetch
+    """
+    endpoint = _PROFILE_URL(username)
+    r = _get(endpoint)
+    # Raise before caching so a failed lookup is retried on the next call
+    r.raise_for_status()
+    return _json(r)
+
+
+def _fetch_public_profile(username: str) -> Dict:
+    """
+    Get a user's cached public profile as a copy, so callers can't alter the cache
+    """
+    return deepcopy(_cached_public_profile(username))
 
 
 def get_user_id(username: str) -> int:
     """
     Get the user ID of a Substack user.
 
+    The profile is fetched once per username and cached for the life of the
+    process, so later changes to it are not picked up.
+
     Parameters
     ----------
     username : str
         The username of the Substack user.
     """
-    endpoint = f"https://substack.com/api/v1/user/{username}/public_profile"
-    r = requests.get(endpoint, headers=HEADERS, timeout=30)
-    user_id = r.json()["id"]
-    return user_id
+    return _fetch_public_profile(username)["id"]
 
 
 def get_user_reads(username: str) -> List[Dict[str, str]]:
     """
     Get newsletters from the "Reads" section of a user's profile.
 
+    The profile is fetched once per username and cached for the life of the
+    process, so later changes to it are not picked up.
+
     Parameters
     ----------
     username : str
         The username of the Substack user.
     """
-    endpoint = f"https://substack.com/api/v1/user/{username}/public_profile"
-    r = requests.get(endpoint, headers=HEADERS, timeout=30)
-    user_data = r.json()
+    return _parse_reads(_fetch_public_profile(username))
+
+
+def _parse_reads(user_data: Dict) -> List[Dict[str, str]]:
     reads = [
         {
             "publication_id": i["publication"]["id"],
@@ -54,11 +80,10 @@ def get_user_likes(user_id: int):
     user_id : int
         The user ID of the Substack user.
     """
-    endpoint = (
-        f"https://substack.com/api/v1/reader/feed/profile/{user_id}?types%5B%5D=like"
-    )
-    r = requests.get(endpoint, headers=HEADERS, timeout=30)
-    likes = r.json()["items"]
+    endpoint = f"{_FEED_URL(user_id)}?types%5B%5D=like"
+    r = _get(endpoint)
+    r.raise_for_status()
+    likes = _json(r)["items"]
     return likes
 
 
@@ -71,7 +96,36 @@ def get_user_notes(user_id: int):
     user_id : int
         The user ID of the Substack user.
     """
-    endpoint = f"https://substack.com/api/v1/reader/feed/profile/{user_id}"
-    r = requests.get(endpoint, headers=HEADERS, timeout=30)
-    notes = r.json()["items"]
+    endpoint = _FEED_URL(user_id)
+    r = _get(endpoint)
+    r.raise_for_status()
+    notes = _json(r)["items"]
     return notes
+
+
+def get_user_activity(username: str) -> Dict:
+    """
+    Get a user's ID, reads, likes, and notes, fetching likes and notes concurrently.
+
+    Like the other helpers here, raises `requests.HTTPError` if Substack
+    responds with an error status.
+
+    The ID and reads come from the same cached profile as `get_user_id` and
+    `get_user_reads`; likes and notes are always fetched fresh.
+
+    Parameters
+    ----------
+    username : str
+        The username of the Substack user.
+    """
+    user_data = _fetch_public_profile(username)
+    user_id = user_data["id"]
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        likes = executor.submit(get_user_likes, user_id)
+        notes = executor.submit(get_user_notes, user_id)
+        return {
+            "user_id": user_id,
+            "reads": _parse_reads(user_data),
+            "likes": likes.result(),
+            "notes": notes.result(),
+        }
@@ -0,0 +1,68 @@
+import importlib.util
+import threading
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+from substack_api._http import _get, _json
+from tests.utils import mock_response
+
+
+class TestJson(unittest.TestCase):
+    @unittest.skipUnless(importlib.util.find_spec("orjson"), "orjson is not installed")
+    def test_json_orjson(self):
+        r = mock_response({"id": 1, "items": ["a"]})
+        r.json = None
+        self.assertEqual(_json(r), {"id": 1, "items": ["a"]})
+
+    @patch("substack_api._http.orjson", None)
+    def test_json_without_orjson(self):
+        r = SimpleNamespace(json=lambda: {"id": 1}, content=b"not read")
+        self.assertEqual(_json(r), {"id": 1})
+
+
+class TestGet(unittest.TestCase):
+    @patch("substack_api._http._SESSION.get")
+    @patch("substack_api._http._LIMITER")
+    def test_get_is_rate_limited(self, mock_limiter, mock_get):
+        url = "https://substack.com/api/v1/categories"
+        _get(url)
+        mock_limiter.acquire.assert_called_once()
+        mock_get.assert_called_once_with(url, timeout=30)
+
+    @patch("substack_api._http.sleep")
+    @patch("substack_api._http._SESSION.get")
+    @patch("substack_api._http._LIMITER")
+    def test_get_retries_under_limiter(self, mock_limiter, mock_get, mock_sleep):
+        limited = SimpleNamespace(status_code=429, headers={"Retry-After": "2"})
+        failed = SimpleNamespace(status_code=503, headers={})
+        ok = mock_response({})
+        mock_get.side_effect = [limited, failed, ok]
+
+        self.assertIs(_get("https://substack.com/api/v1/categories"), ok)
+        # Every attempt, retries included, waits on the shared limiter
+        self.assertEqual(mock_limiter.acquire.call_count, 3)
+        self.assertEqual([c.args[0] for c in mock_sleep.call_args_list], [2, 0.6])
+
+    @patch("substack_api._http.sleep")
+    @patch("substack_api._http._SESSION.get")
+    @patch("substack_api._http._LIMITER")
+    def test_get_gives_up_after_retries(self, mock_limiter, mock_get, mock_sleep):
+        failed = SimpleNamespace(status_code=503, headers={})
+        mock_get.return_value = failed
+
+        self.assertIs(_get("https://substack.com/api/v1/categories"), failed)
+        self.assertEqual(mock_get.call_count, 4)
+
+    @patch("substack_api._http._SESSION.get")
+    @patch("substack_api._http._LIMITER")
+    def test_get_cancelled_while_waiting(self, mock_limiter, mock_get):
+        cancelled = threading.Event()
+        # The caller gives up while this request waits for a token
+        mock_limiter.acquire.side_effect = cancelled.set
+
+        self.assertIsNone(_get("https://substack.com/api/v1/categories", cancelled))
+        mock_get.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,33 +1,203 @@
+import importlib.util
+import math
+import os
+import tempfile
+import threading
+import time
 import unittest
-from unittest.mock import patch, Mock, MagicMock
+from types import SimpleNamespace
+from unittest.mock import patch
 from bs4 import BeautifulSoup
+import substack_api._http as http
+import substack_api.newsletter as newsletter
+from substack_api._http import _RateLimiter
 from substack_api.newsletter import (
+    _HTML_PARSER,
+    _fetch_categories,
+    category_id_to_name,
+    enable_response_cache,
+    category_name_to_id,
     get_newsletter_post_metadata,
     get_newsletter_recommendations,
+    get_newsletters_in_category,
     get_post_contents,
+    get_posts_contents,
+    get_rate_limit,
+    get_recommendations_for_newsletters,
+    iter_newsletter_post_metadata,
+    list_all_categories,
+    set_rate_limit,
     HEADERS,
 )
+from tests.utils import mock_response, pause_rate_limit
+
+
+def setUpModule():
+    pause_rate_limit()
+
+
+class TestRateLimiter(unittest.TestCase):
+    @patch("substack_api._http.sleep")
+    @patch("substack_api._http.monotonic")
+    def test_rate_limiter_blocks_only_when_empty(self, mock_monotonic, mock_sleep):
+        mock_monotonic.return_value = 100.0
+        limiter = _RateLimiter(rate=2, capacity=2)
+
+        for _ in range(4):
+            limiter.acquire()
+        self.assertEqual([c.args[0] for c in mock_sleep.call_args_list], [0.5, 1.0])
+
+        # Tokens refill with elapsed time
+        mock_sleep.reset_mock()
+        mock_monotonic.return_value = 102.0
+        limiter.acquire()
+        mock_sleep.assert_not_called()
+
+    def test_set_rate_limit(self):
+        self.addCleanup(setattr, http, "_LIMITER", http._LIMITER)
+
+        set_rate_limit(5)
+        self.assertEqual(get_rate_limit(), 5)
+        self.assertEqual(http._LIMITER.rate, 5)
+        self.assertEqual(http._LIMITER.capacity, 5)
+        with self.assertRaises(ValueError):
+            set_rate_limit(0)
+
+
+@unittest.skipUnless(
+    importlib.util.find_spec("requests_cache"), "requests-cache is not installed"
+)
+class TestEnableResponseCache(unittest.TestCase):
+    def setUp(self):
+        self.addCleanup(setattr, http, "_SESSION", http._SESSION)
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.cache_name = os.path.join(tmpdir.name, "cache")
+
+    def test_enable_response_cache(self):
+        import requests_cache
+
+        enable_response_cache(expire_after=60, cache_name=self.cache_name)
+
+        self.assertIsInstance(http._SESSION, requests_cache.CachedSession)
+        self.assertEqual(http._SESSION.settings.expire_after, 60)
+        # expire_after wins over the server's Cache-Control headers
+        self.assertFalse(http._SESSION.settings.cache_control)
+        self.assertEqual(http._SESSION.headers["User-Agent"], HEADERS["User-Agent"])
+
+    def test_enable_response_cache_follows_cache_control(self):
+        enable_response_cache(expire_after=None, cache_name=self.cache_name)
+
+        self.assertTrue(http._SESSION.settings.cache_control)
+
+
+class TestListAllCategories(unittest.TestCase):
+    def setUp(self):
+        _fetch_categories.cache_clear()
+
+    def tearDown(self):
+        _fetch_categories.cache_clear()
+
+    @patch("substack_api._http._SESSION.get")
+    def test_list_all_categories_cached(self, mock_get):
+        mock_get.return_value = mock_response(
+            [{"name": "Technology", "id": 4}, {"name": "Culture", "id": 96}]
+        )
+
+        first = list_all_categories()
+        first.append(("Mutated", 0))
+        second = list_all_categories()
+
+        self.assertEqual(second, [("Technology", 4), ("Culture", 96)])
+        mock_get.assert_called_once_with(
+            "https://substack.com/api/v1/categories", timeout=30
+        )
+
+    @patch("substack_api._http._SESSION.get")
+    def test_category_lookups(self, mock_get):
+        mock_get.return_value = mock_response(
+            [{"name": "Technology", "id": 4}, {"name": "Culture", "id": 96}]
+        )
+
+        cases = [
+            (category_id_to_name, 96, "Culture", 1),
+            (category_name_to_id, "Technology", 4, "Invalid"),
+        ]
+        for lookup, key, expected, missing in cases:
+            with self.subTest(lookup=lookup.__name__):
+                self.assertEqual(lookup(key), expected)
+                with self.assertRaises(ValueError):
+                    lookup(missing)
+        # Both directions are served from one fetch of the category list
+        mock_get.assert_called_once()
+
+
+class TestGetNewslettersInCategory(unittest.TestCase):
+    def _pages(self, n_pages):
+        def get(url, timeout):
+            page = int(url.split("page=")[-1])
+            return mock_response(
+                {
+                    "publications": [{"id": page, "name": f"pub-{page}"}],
+                    "more": page < n_pages - 1,
+                }
+            )
+
+        return get
+
+    @patch("substack_api._http._SESSION.get")
+    def test_get_newsletters_in_category_all_pages(self, mock_get):
+        mock_get.side_effect = self._pages(12)
+
+        result = get_newsletters_in_category(4, subdomains_only=True)
+        self.assertEqual(result, list(range(12)))
+
+    @patch("substack_api._http._SESSION.get")
+    def test_get_newsletters_in_category_page_range(self, mock_get):
+        mock_get.side_effect = self._pages(12)
+
+        result = get_newsletters_in_category(4, start_page=2, end_page=5)
+        self.assertEqual(
+            result,
+            [
+                {"id": 2, "name": "pub-2"},
+                {"id": 3, "name": "pub-3"},
+                {"id": 4, "name": "pub-4"},
+            ],
+        )
+        self.assertEqual(mock_get.call_count, 3)
 
 
 class TestGetNewsletterPostMetadata(unittest.TestCase):
-    @patch("requests.get")
+    def _archive(self, n_posts):
+        def get(url, timeout):
+            offset = int(url.split("offset=")[1].split("&")[0])
+            limit = int(url.split("limit=")[1])
+            posts = range(offset, min(offset + limit, n_posts))
+            return mock_response([{"id": i, "slug": f"post-{i}"} for i in posts])
+
+        return get
+
+    @patch("substack_api._http._SESSION.get")
     def test_get_newsletter_post_metadata_slugs_only(self, mock_get):
-        mock_get.return_value = Mock(ok=True)
-        mock_get.return_value.json.return_value = [
-            {"id": 1, "slug": "post-1"},
-            {"id": 2, "slug": "post-2"},
-        ]
+        mock_get.return_value = mock_response(
+            [
+                {"id": 1, "slug": "post-1"},
+                {"id": 2, "slug": "post-2"},
+            ]
+        )
 
         result = get_newsletter_post_metadata("test_subdomain", slugs_only=True)
         self.assertEqual(result, ["post-1", "post-2"])
 
-    @patch("requests.get")
+    @patch("substack_api._http._SESSION.get")
     def test_get_newsletter_post_metadata_all_metadata(self, mock_get):
-        mock_get.return_value = Mock(ok=True)
-        mock_get.return_value.json.return_value = [
-            {"id": 1, "slug": "post-1", "title": "Post 1"},
-            {"id": 2, "slug": "post-2", "title": "Post 2"},
-        ]
+        mock_get.return_value = mock_response(
+            [
+                {"id": 1, "slug": "post-1", "title": "Post 1"},
+                {"id": 2, "slug": "post-2", "title": "Post 2"},
+            ]
+        )
 
         result = get_newsletter_post_metadata("test_subdomain", slugs_only=False)
         self.assertEqual(
@@ -38,100 +208,218 @@ class TestGetNewsletterPostMetadata(unittest.TestCase):
             ],
         )
 
-    @patch("requests.get")
+    @patch("substack_api._http._SESSION.get")
     def test_get_newsletter_post_metadata_pagination(self, mock_get):
         mock_get.side_effect = [
-            Mock(
-                ok=True,
-                json=Mock(
-                    return_value=[
-                        {"id": 1, "slug": "post-1"},
-                        {"id": 2, "slug": "post-2"},
-                    ]
-                ),
-            ),
-            Mock(
-                ok=True,
-                json=Mock(
-                    return_value=[
-                        {"id": 3, "slug": "post-3"},
-                        {"id": 4, "slug": "post-4"},
-                    ]
-                ),
+            mock_response([{"id": i, "slug": f"post-{i}"} for i in range(10)]),
+            mock_response(
+                [
+                    {"id": 10, "slug": "post-10"},
+                    {"id": 11, "slug": "post-11"},
+                ]
             ),
         ]
 
         result = get_newsletter_post_metadata(
             "test_subdomain", slugs_only=True, start_offset=0, end_offset=20
         )
-        self.assertEqual(result, ["post-1", "post-2", "post-3", "post-4"])
+        self.assertEqual(result, [f"post-{i}" for i in range(12)])
 
-    @patch("requests.get")
+    @patch("substack_api._http._SESSION.get")
+    def test_get_newsletter_post_metadata_short_first_page(self, mock_get):
+        mock_get.return_value = mock_response([{"id": 1, "slug": "post-1"}])
+
+        result = get_newsletter_post_metadata("test_subdomain", slugs_only=True)
+        self.assertEqual(result, ["post-1"])
+        # A short page ends the archive, so no further pages are requested
+        mock_get.assert_called_once()
+
+    @patch("substack_api._http._SESSION.get")
+    def test_get_newsletter_post_metadata_short_last_page(self, mock_get):
+        mock_get.side_effect = self._archive(25)
+
+        result = get_newsletter_post_metadata("test_subdomain", slugs_only=True)
+        self.assertEqual(result, [f"post-{i}" for i in range(25)])
+        # Offsets 0, 10 and 20; the short third page ends the archive
+        requested = [c.args[0].split("offset=")[1] for c in mock_get.call_args_list]
+        self.assertEqual(requested, ["0&limit=10", "10&limit=10", "20&limit=10"])
+
+    @patch("substack_api._http._SESSION.get")
+    def test_get_newsletter_post_metadata_many_pages(self, mock_get):
+        def get(url, timeout):
+            offset = int(url.split("offset=")[1].split("&")[0])
+            if offset >= 120:
+                return mock_response([])
+            posts = [{"id": i, "slug": f"post-{i}"} for i in range(offset, offset + 10)]
+            return mock_response(posts)
+
+        mock_get.side_effect = get
+
+        result = get_newsletter_post_metadata("test_subdomain", slugs_only=True)
+        self.assertEqual(result, [f"post-{i}" for i in range(120)])
+
+    @patch("substack_api._http._SESSION.get")
+    def test_get_newsletter_post_metadata_known_end_is_concurrent(self, mock_get):
+        archive = self._archive(1000)
+        lock = threading.Lock()
+        active = [0]
+        peak = [0]
+
+        def get(url, timeout):
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.02)
+            with lock:
+                active[0] -= 1
+            return archive(url, timeout)
+
+        mock_get.side_effect = get
+
+        result = get_newsletter_post_metadata(
+            "test_subdomain", slugs_only=True, end_offset=200
+        )
+        self.assertEqual(result, [f"post-{i}" for i in range(200)])
+        self.assertEqual(mock_get.call_count, 20)
+        self.assertGreater(peak[0], 1)
+        self.assertLessEqual(peak[0], newsletter.MAX_WORKERS)
+
+    @patch("substack_api._http._SESSION.get")
+    def test_get_newsletter_post_metadata_partial_last_page(self, mock_get):
+        mock_get.side_effect = [
+            mock_response([{"id": i} for i in range(10)]),
+            mock_response([{"id": i} for i in range(10, 13)]),
+        ]
+
+        result = get_newsletter_post_metadata("test_subdomain", end_offset=13)
+        self.assertEqual(len(result), 13)
+        self.assertTrue(mock_get.call_args.args[0].endswith("&offset=10&limit=3"))
+
+    @patch("substack_api._http._SESSION.get")
+    def test_iter_newsletter_post_metadata_is_lazy(self, mock_get):
+        mock_get.side_effect = self._archive(1000)
+
+        posts = iter_newsletter_post_metadata("test_subdomain", slugs_only=True)
+        mock_get.assert_not_called()
+        consumed = 0
+        for n in (1, 9, 5, 20):
+            for _ in range(n):
+                self.assertEqual(next(posts), f"post-{consumed}")
+                consumed += 1
+            # Pages needed so far, plus at most one fetched ahead
+            self.assertLessEqual(mock_get.call_count, math.ceil(consumed / 10) + 1)
+        posts.close()
+
+    @patch("substack_api._http._SESSION.get")
+    def test_iter_newsletter_post_metadata_close_does_not_wait(self, mock_get):
+        release = threading.Event()
+        archive = self._archive(1000)
+
+        def get(url, timeout):
+            if "offset=0&" not in url:
+                release.wait(5)
+            return archive(url, timeout)
+
+        mock_get.side_effect = get
+
+        posts = iter_newsletter_post_metadata("test_subdomain")
+        next(posts)
+        started = time.monotonic()
+        posts.close()
+        self.assertLess(time.monotonic() - started, 1)
+        release.set()
+
+    @patch("substack_api._http._SESSION.get")
     def test_get_newsletter_post_metadata_no_posts(self, mock_get):
-        mock_get.return_value = Mock(ok=True)
-        mock_get.return_value.json.return_value = []
+        mock_get.return_value = mock_response([])
 
         result = get_newsletter_post_metadata("test_subdomain")
         self.assertEqual(result, [])
 
 
 class TestGetNewsletterRecommendations(unittest.TestCase):
-    @patch("requests.get")
-    @patch.object(BeautifulSoup, "find_all")
-    @patch.object(BeautifulSoup, "__init__", return_value=None)
-    def test_get_newsletter_recommendations(
-        self, mock_bs_init, mock_find_all, mock_get
-    ):
-        mock_get.return_value = Mock(ok=True)
-        mock_get.return_value.text = "mocked_html"
-
-        mock_div = MagicMock()
-        mock_div.find.return_value = {"href": "https://mocked_url.com?param=value"}
-
-        mock_find_all.side_effect = [
-            [mock_div, mock_div],  # div_elements
-            [Mock(text="title1"), Mock(text="title2")],  # titles
-        ]
+    @patch("substack_api._http._SESSION.get")
+    def test_get_newsletter_recommendations(self, mock_get):
+        card = (
+            '<div class="publication">'
+            '<div class="publication-content"><a href="{url}?param=value">'
+            '<div class="publication-title">{title}</div></a></div></div>'
+        )
+        mock_get.return_value = SimpleNamespace(
+            ok=True,
+            status_code=200,
+            text="".join(
+                card.format(url=f"https://mocked_url{i}.com", title=f"title{i}")
+                for i in (1, 2)
+            ),
+        )
 
         result = get_newsletter_recommendations("test_subdomain")
 
         self.assertEqual(
             result,
             [
-                {"title": "title1", "url": "https://mocked_url.com"},
-                {"title": "title2", "url": "https://mocked_url.com"},
+                {"title": "title1", "url": "https://mocked_url1.com"},
+                {"title": "title2", "url": "https://mocked_url2.com"},
             ],
         )
 
         mock_get.assert_called_once_with(
             "https://test_subdomain.substack.com/recommendations",
-            headers=HEADERS,
             timeout=30,
         )
-        mock_bs_init.assert_called_once_with("mocked_html", "html.parser")
-        self.assertEqual(mock_find_all.call_count, 2)
+        self.assertEqual(http._SESSION.headers["User-Agent"], HEADERS["User-Agent"])
+
+    @patch("substack_api._http._SESSION.get")
+    @patch.object(BeautifulSoup, "__init__", return_value=None)
+    def test_get_newsletter_recommendations_parser(self, mock_bs_init, mock_get):
+        mock_get.return_value = SimpleNamespace(
+            ok=True, status_code=200, text="mocked_html"
+        )
+
+        with patch.object(BeautifulSoup, "find_all", return_value=[]) as find_all:
+            self.assertEqual(get_newsletter_recommendations("test_subdomain"), [])
+
+        mock_bs_init.assert_called_once_with("mocked_html", _HTML_PARSER)
+        self.assertEqual(find_all.call_count, 1)
+
+
+class TestGetRecommendationsForNewsletters(unittest.TestCase):
+    @patch("substack_api.newsletter.get_newsletter_recommendations")
+    def test_get_recommendations_for_newsletters(self, mock_recs):
+        mock_recs.side_effect = lambda subdomain: [
+            {"title": f"rec of {subdomain}", "url": "https://mocked_url.com"}
+        ]
+
+        result = get_recommendations_for_newsletters(["a", "b", "c"])
+
+        self.assertEqual(list(result), ["a", "b", "c"])
+        self.assertEqual(
+            result["b"], [{"title": "rec of b", "url": "https://mocked_url.com"}]
+        )
+        self.assertEqual(mock_recs.call_count, 3)
 
 
 class TestGetPostContents(unittest.TestCase):
-    @patch("requests.get")
+    @patch("substack_api._http._SESSION.get")
     def test_get_post_contents_html_only(self, mock_get):
-        mock_get.return_value = Mock(ok=True)
-        mock_get.return_value.json.return_value = {
-            "body_html": "<html><body>Test post</body></html>"
-        }
+        mock_get.return_value = mock_response(
+            {"body_html": "<html><body>Test post</body></html>"}
+        )
 
         result = get_post_contents("test_subdomain", "test_slug", html_only=True)
         self.assertEqual(result, "<html><body>Test post</body></html>")
 
-    @patch("requests.get")
+    @patch("substack_api._http._SESSION.get")
     def test_get_post_contents_all_metadata(self, mock_get):
-        mock_get.return_value = Mock(ok=True)
-        mock_get.return_value.json.return_value = {
-            "body_html": "<html><body>Test post</body></html>",
-            "title": "Test post",
-            "author": "Test author",
-            "date": "2022-01-01",
-        }
+        mock_get.return_value = mock_response(
+            {
+                "body_html": "<html><body>Test post</body></html>",
+                "title": "Test post",
+                "author": "Test author",
+                "date": "2022-01-01",
+            }
+        )
 
         result = get_post_contents("test_subdomain", "test_slug", html_only=False)
         self.assertEqual(
@@ -145,5 +433,37 @@ class TestGetPostContents(unittest.TestCase):
         )
 
 
+class TestGetPostsContents(unittest.TestCase):
+    @patch("substack_api._http._SESSION.get")
+    def test_get_posts_contents_preserves_order(self, mock_get):
+        mock_get.side_effect = lambda url, timeout: mock_response(
+            {"slug": url.rsplit("/", 1)[-1], "body_html": f"<p>{url}</p>"}
+        )
+
+        slugs = [f"post-{i}" for i in range(20)]
+        result = get_posts_contents("test_subdomain", slugs)
+        self.assertEqual([post["slug"] for post in result], slugs)
+
+        html = get_posts_contents("test_subdomain", ["post-1"], html_only=True)
+        self.assertEqual(
+            html, ["<p>https://test_subdomain.substack.com/api/v1/posts/post-1</p>"]
+        )
+
+    @patch("substack_api._http._SESSION.get")
+    def test_get_posts_contents_fetches_duplicates_once(self, mock_get):
+        mock_get.side_effect = lambda url, timeout: mock_response(
+            {"slug": url.rsplit("/", 1)[-1]}
+        )
+
+        result = get_posts_contents("test_subdomain", ["a", "b", "a", "a"])
+        self.assertEqual([post["slug"] for post in result], ["a", "b", "a", "a"])
+        self.assertEqual(mock_get.call_count, 2)
+
+        # Repeats are independent copies
+        result[0]["slug"] = "changed"
+        self.assertEqual([post["slug"] for post in result[2:]], ["a", "a"])
+        self.assertIsNot(result[2], result[3])
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -1,30 +1,47 @@
 import unittest
-from unittest.mock import patch
+from unittest.mock import patch, Mock
+import requests
 from substack_api.user import (
+    _cached_public_profile,
+    _fetch_public_profile,
     get_user_id,
     get_user_reads,
     get_user_likes,
     get_user_notes,
+    get_user_activity,
 )
+from tests.utils import mock_response, pause_rate_limit
+
+
+def setUpModule():
+    pause_rate_limit()
 
 
 class TestUser(unittest.TestCase):
-    @patch("requests.get")
+    def setUp(self):
+        _cached_public_profile.cache_clear()
+
+    def tearDown(self):
+        _cached_public_profile.cache_clear()
+
+    @patch("substack_api._http._SESSION.get")
     def test_get_user_id(self, mock_get):
-        mock_get.return_value.json.return_value = {"id": 123}
+        mock_get.return_value = mock_response({"id": 123})
         result = get_user_id("testuser")
         self.assertEqual(result, 123)
 
-    @patch("requests.get")
+    @patch("substack_api._http._SESSION.get")
     def test_get_user_reads(self, mock_get):
-        mock_get.return_value.json.return_value = {
-            "subscriptions": [
-                {
-                    "publication": {"id": "123", "name": "Test Publication"},
-                    "membership_state": "subscribed",
-                }
-            ]
-        }
+        mock_get.return_value = mock_response(
+            {
+                "subscriptions": [
+                    {
+                        "publication": {"id": "123", "name": "Test Publication"},
+                        "membership_state": "subscribed",
+                    }
+                ]
+            }
+        )
         expected_result = [
             {
                 "publication_id": "123",
@@ -35,18 +52,83 @@ class TestUser(unittest.TestCase):
         result = get_user_reads("testuser")
         self.assertEqual(result, expected_result)
 
-    @patch("requests.get")
+    @patch("substack_api._http._SESSION.get")
+    def test_public_profile_cached(self, mock_get):
+        mock_get.return_value = mock_response({"id": 123, "subscriptions": []})
+        self.assertEqual(get_user_id("testuser"), 123)
+        self.assertEqual(get_user_reads("testuser"), [])
+        mock_get.assert_called_once()
+
+    @patch("substack_api._http._SESSION.get")
+    def test_public_profile_copies_are_independent(self, mock_get):
+        mock_get.return_value = mock_response(
+            {"id": 123, "subscriptions": [{"publication": {"id": "1", "name": "A"}}]}
+        )
+        _fetch_public_profile("testuser")["subscriptions"].clear()
+        self.assertEqual(len(_fetch_public_profile("testuser")["subscriptions"]), 1)
+
+    @patch("substack_api._http._SESSION.get")
+    def test_public_profile_errors_not_cached(self, mock_get):
+        error = mock_response({"errors": []})
+        error.raise_for_status = Mock(side_effect=requests.HTTPError("404"))
+        mock_get.side_effect = [error, mock_response({"id": 123})]
+
+        with self.assertRaises(requests.HTTPError):
+            get_user_id("testuser")
+        self.assertEqual(get_user_id("testuser"), 123)
+        self.assertEqual(mock_get.call_count, 2)
+
+    @patch("substack_api._http._SESSION.get")
+    def test_feed_errors_raise(self, mock_get):
+        error = mock_response({"errors": []})
+        error.raise_for_status = Mock(side_effect=requests.HTTPError("404"))
+        mock_get.return_value = error
+
+        for helper in (get_user_likes, get_user_notes):
+            with self.subTest(helper=helper.__name__):
+                with self.assertRaises(requests.HTTPError):
+                    helper(123)
+
+    @patch("substack_api._http._SESSION.get")
     def test_get_user_likes(self, mock_get):
-        mock_get.return_value.json.return_value = {"items": ["post1", "post2"]}
+        mock_get.return_value = mock_response({"items": ["post1", "post2"]})
         result = get_user_likes(123)
         self.assertEqual(result, ["post1", "post2"])
 
-    @patch("requests.get")
+    @patch("substack_api._http._SESSION.get")
     def test_get_user_notes(self, mock_get):
-        mock_get.return_value.json.return_value = {"items": ["note1", "note2"]}
+        mock_get.return_value = mock_response({"items": ["note1", "note2"]})
         result = get_user_notes(123)
         self.assertEqual(result, ["note1", "note2"])
 
+    @patch("substack_api._http._SESSION.get")
+    def test_get_user_activity(self, mock_get):
+        def fake_get(url, **kwargs):
+            if url.endswith("/public_profile"):
+                return mock_response(
+                    {
+                        "id": 123,
+                        "subscriptions": [
+                            {
+                                "publication": {"id": "1", "name": "Test Publication"},
+                                "membership_state": "subscribed",
+                            }
+                        ],
+                    }
+                )
+            elif url.endswith("types%5B%5D=like"):
+                return mock_response({"items": ["post1"]})
+            return mock_response({"items": ["note1"]})
+
+        mock_get.side_effect = fake_get
+        result = get_user_activity("testuser")
+        self.assertEqual(result["user_id"], 123)
+        self.assertEqual(result["reads"][0]["publication_name"], "Test Publication")
+        self.assertEqual(result["likes"], ["post1"])
+        self.assertEqual(result["notes"], ["note1"])
+        # The profile is fetched once, then likes and notes
+        self.assertEqual(mock_get.call_count, 3)
+
 
 if __name__ == "__main__":
     unittest.main()
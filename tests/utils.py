@@ -0,0 +1,24 @@
+import json
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+
+def mock_response(payload):
+    """Build a fake response exposing the payload via both .json() and .content"""
+    return SimpleNamespace(
+        ok=True,
+        status_code=200,
+        headers={},
+        json=lambda: payload,
+        content=json.dumps(payload).encode(),
+        raise_for_status=lambda: None,
+    )
+
+
+def pause_rate_limit():
+    """Stop mocked requests from waiting on the shared rate limiter for the
+    rest of the calling test module"""
+    limiter = patch("substack_api._http._LIMITER.acquire")
+    limiter.start()
+    unittest.addModuleCleanup(limiter.stop)